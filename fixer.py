@@ -1,26 +1,74 @@
 #!/usr/bin/env python3
 import os
 import sys
+import asyncio
+import collections
 import difflib
+import functools
+import hashlib
+import itertools
+import mmap
+import shelve
 import shutil
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
 
+import httpx
 import ollama
-import spacy
+import numpy
+from rapidfuzz import fuzz, process
+from rapidfuzz.distance import Indel
+
+try:
+    import difflib_fast # Optional: native, multi-threaded difflib ratios
+except ImportError:
+    difflib_fast = None
+
+try:
+    import fcntl # Not available on Windows
+except ImportError:
+    fcntl = None
 
 # ─── Parameters ─────────────────────────────────────────────────────────────
 CHUNK_CHARS_LIMIT  = 2500           # Max character count for each text chunk
 OUTPUT_PERCENT     = 50             # % of the chunk that will be written to output
 MODEL_NAME         = "gemma3n:latest"      # Name of the Ollama model
 MISMATCH_THRESHOLD = 0.02           # Threshold for text similarity mismatch
+PARALLEL_REQUESTS  = 4              # Max concurrent Ollama requests (match OLLAMA_NUM_PARALLEL)
+KEEP_ALIVE         = "30m"          # How long Ollama keeps the model loaded between requests
+CACHE_DIR          = ".cache/text-fixer"   # Where corrections are kept between runs
+NUM_CTX            = 4096           # Model context window: the prompts, a chunk and its correction
 # ─────────────────────────────────────────────────────────────────────────────
 OVERLAP_PERCENT    = (100 - OUTPUT_PERCENT)  # % of overlap between chunks
 MAX_OVERLAP_SIZE = CHUNK_CHARS_LIMIT * OVERLAP_PERCENT / 100 # Size of overlap in characters
+CHUNK_OUTPUT_SIZE = CHUNK_CHARS_LIMIT - MAX_OVERLAP_SIZE # Characters of each chunk before the overlap begins
+MAX_SENTENCE_SIZE = (CHUNK_CHARS_LIMIT - CHUNK_OUTPUT_SIZE) / 2 # Longest sentence that fits in the overlap
 MAX_SIMILARITY_RETRIES = 3 # Number of retries before discarding invalid chunks elaborations
+SIMILARITY_WORKERS = min(os.cpu_count() or 1, 61) # Similarity searches run at once, one process per core (Windows allows at most 61)
+FICLONE = 0x40049409 # Linux ioctl cloning a file copy-on-write (Btrfs, XFS, bcachefs…)
 # ─────────────────────────────────────────────────────────────────────────────
 
-# Set up a blank multilingual SpaCy model with sentence segmentation
-nlp = spacy.blank("xx")
-nlp.add_pipe("sentencizer")
+# Shared Ollama client: its connection pool keeps one keep-alive connection per parallel request
+client = ollama.AsyncClient(limits=httpx.Limits(max_connections=PARALLEL_REQUESTS, max_keepalive_connections=PARALLEL_REQUESTS))
+
+# Set up a blank multilingual SpaCy model with sentence segmentation, on first use only
+# (similarity worker processes never need it)
+@functools.cache
+def get_nlp():
+    import spacy
+    nlp = spacy.blank("xx")
+    nlp.add_pipe("sentencizer")
+    nlp.max_length = 10_000_000     # Only tokenizer + sentencizer run, long paragraphs are cheap
+    return nlp
+
+# A segmented sentence: its text and where it starts and ends in the segmented string
+Sentence = collections.namedtuple("Sentence", ["text", "start_char", "end_char"])
+
+# Splits a corrected chunk into sentences. Answers replayed from the cache (e.g. after an overlap
+# reduction) are the same strings, so they are only segmented once.
+@functools.lru_cache(maxsize=256)
+def segment_sentences(text):
+    return tuple(Sentence(s.text, s.start_char, s.end_char) for s in get_nlp()(text).sents)
 
 def backup_file(src_path, step):
     folder_file = os.path.dirname(src_path)
@@ -28,209 +76,471 @@ def backup_file(src_path, step):
     name, est = os.path.splitext(name_file)
     new_name = f"{step}_{name}{est}"
     dest_path = os.path.join(folder_file, new_name)
+    # Snapshots share the output blocks copy-on-write where the filesystem supports it.
+    # A hard link would not do: the output keeps being appended to and truncated in place.
+    if fcntl is not None:
+        try:
+            with open(src_path, "rb") as src, open(dest_path, "wb") as dest:
+                fcntl.ioctl(dest.fileno(), FICLONE, src.fileno())
+            shutil.copystat(src_path, dest_path)
+            return
+        except OSError:
+            pass
     shutil.copy2(src_path, dest_path)
 
-# Truncates the output file from the given index onward
-def truncate_file(path: str, cutoff_index: int):
-    with open(path, 'r+', encoding='utf-8') as f:
-        content = f.read()
-        f.seek(0)
-        f.write(content[:-cutoff_index])
-        f.truncate()
+# Yields the lines of a text file like text.split("\n") would, reading it through a read-only
+# memory map and decoding one line at a time instead of loading the whole file as a string
+def read_paragraphs(path: str):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield ""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pending = ""
+            for line in iter(mm.readline, b""):
+                # Same newline translation as reading in text mode
+                text = line.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+                *paragraphs, pending = (pending + text).split("\n")
+                yield from paragraphs
+            yield pending
+
+# Encodes text the way it is stored in the output file (UTF-8, platform newlines)
+def encode_output(text: str) -> bytes:
+    return text.replace("\n", os.linesep).encode("utf-8")
 
 # Prints the beginning and end of a string to help with debugging
 def print_start_end(string, ratio):
     print(f"{string[0:round(len(string)*ratio)]}…{string[-round(len(string)*ratio):round(len(string))]}")
 
-# Splits the text into chunks with overlapping areas for context preservation
-def chunk_sentences(string_list, chunk_word_limit, overlap_percent):
-    chunk_length = chunk_word_limit - (chunk_word_limit * overlap_percent / 100)
+# Yields the sentence texts of each paragraph, in order. The sentencizer only splits after sentence
+# punctuation, so paragraphs with none before their last character (which must not be whitespace)
+# are a single sentence and skip spaCy; the others go through nlp.pipe in batches as before.
+def paragraph_sentences(string_list, batch_size=64):
+    nlp = get_nlp()
+    punct_chars = nlp.get_pipe("sentencizer").punct_chars
+    paragraphs = iter(string_list)
+    while batch := list(itertools.islice(paragraphs, batch_size)):
+        single = [len(s) > 0 and (s[-1].isalnum() or s[-1] in punct_chars) and not any(c in punct_chars for c in s[:-1]) for s in batch]
+        docs = nlp.pipe([s for s, is_single in zip(batch, single) if not is_single])
+        for s, is_single in zip(batch, single):
+            yield [s] if is_single else [sentence.text for sentence in next(docs).sents]
 
-    chunks = []
-    current_chunk = []
-    current_length = 0
-    old_length = 0
+# Splits the text into chunks with overlapping areas for context preservation.
+# Chunks are yielded as soon as they are complete, while the rest of the text is still being segmented.
+# Cores are greedy runs of sentences up to CHUNK_OUTPUT_SIZE characters, and every chunk is a core
+# followed by the next one, which is its overlap; the last core is also sent on its own
+def chunk_sentences(string_list):
+    previous_core = None
+    core = []
+    core_length = 0
     
-    for s in string_list:
-        substring_list = [s.text for s in nlp(s).sents]
+    for substring_list in paragraph_sentences(string_list):
         if len(substring_list) > 0:
             substring_list[-1] += "\n"
         else:
             substring_list = ["\n"]
-        for ss in substring_list:
-            corrected_len = len(ss) - ss.count("\n")
-            if corrected_len > (chunk_word_limit - chunk_length) / 2:
-                raise ValueError(f"String too long, increase CHUNK_CHARS_LIMIT: {ss} ({corrected_len} > {chunk_word_limit - chunk_length})")
-
-            if current_length + corrected_len <= chunk_length:
-                current_chunk.append(ss)
-                current_length += corrected_len
-            else:
-                chunks.append(" ".join(current_chunk))
-                current_chunk = [ss]
-                old_length = current_length 
-                current_length = corrected_len
-
-            if old_length <= chunk_word_limit and len(chunks) > 0:
-                chunks[-1] += f" {ss}"
-                old_length += corrected_len
-
-    if len(current_chunk) > 0:
-        chunks.append(" ".join(current_chunk))
-
-    return chunks
-
-# Sends a text chunk to the Ollama model for basic correction (spelling, formatting)
-def correct_chunk_with_ollama(chunk: str) -> str:
-    prompt = (
-        "Ora ti fornisco una porzione di testo.\n"
-        "Correggi solo errori ortografici e di battitura, accenti sbagliati e problemi di formattazione se ci sono.\n"
-        "Non riformulare frasi e non aggiungere grassetti o corsivi.\n"
-        "Originale:\n"
-        f"{chunk}\n"
-        f"Corretto:\n"
-    )
+        last_substring_index = len(substring_list) - 1
+        for substring_index, ss in enumerate(substring_list):
+            # Paragraphs hold no newline: the only one is appended to their last sentence
+            corrected_len = len(ss) - (1 if substring_index == last_substring_index else 0)
+            if corrected_len > MAX_SENTENCE_SIZE:
+                raise ValueError(f"String too long, increase CHUNK_CHARS_LIMIT: {ss} ({corrected_len} > {CHUNK_CHARS_LIMIT - CHUNK_OUTPUT_SIZE})")
+
+            if core_length + corrected_len > CHUNK_OUTPUT_SIZE:
+                if previous_core is not None:
+                    yield " ".join(previous_core + core)
+                previous_core = core
+                core = []
+                core_length = 0
+            core.append(ss)
+            core_length += corrected_len
+
+    if previous_core is not None:
+        yield " ".join(previous_core + core)
+    if len(core) > 0:
+        yield " ".join(core)
+
+# Instructions shared by every request: sent as an identical system message so the server can reuse the prompt prefix
+SYSTEM_PROMPT = (
+    "Ora ti fornisco una porzione di testo.\n"
+    "Correggi solo errori ortografici e di battitura, accenti sbagliati e problemi di formattazione se ci sono.\n"
+    "Non riformulare frasi e non aggiungere grassetti o corsivi."
+)
+
+# The user prompt wraps the chunk between these two fixed parts
+PROMPT_PREFIX = "Originale:\n"
+PROMPT_SUFFIX = "\nCorretto:\n"
+
+# Corrections already received, kept on disk so reruns (e.g. after a crash) are not sent to the model again
+@functools.cache
+def get_corrections_cache():
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return shelve.open(os.path.join(CACHE_DIR, "corrections"))
+
+# Sends a text chunk to the Ollama model for basic correction (spelling, formatting).
+# The seed makes every attempt reproducible, so asking again for the same attempt is served from the cache.
+async def correct_chunk_with_ollama(chunk: str, seed: int = 0) -> str:
+    prompt = PROMPT_PREFIX + chunk + PROMPT_SUFFIX
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+    # A corrected chunk is about as long as the original, and Italian text runs around 3-4 characters
+    # per token, so 0.4 tokens per character plus some slack only cuts off runaway answers.
+    # The correction mostly copies the input, so repeated tokens are not penalised.
+    # The first attempt is greedy, retries (seed > 0) keep sampling so they can give a different answer.
+    options = {
+        "seed": seed,
+        "num_predict": int(len(chunk) * 0.4) + 64,
+        "num_ctx": NUM_CTX,
+        "repeat_penalty": 1.0,
+    }
+    if seed == 0:
+        options["temperature"] = 0
+
+    # The key covers the whole request, so changing the model, the prompts or the options misses the cache
+    corrections_cache = get_corrections_cache()
+    cache_key = hashlib.blake2b(repr((MODEL_NAME, messages, options)).encode("utf-8"), digest_size=16).hexdigest()
+    if cache_key in corrections_cache:
+        return corrections_cache[cache_key]
+
     print_start_end(chunk, 1/20)
-    resp = ollama.chat(model=MODEL_NAME, messages=[{"role": "user", "content": prompt}])
+    resp = await client.chat(
+        model=MODEL_NAME,
+        messages=messages,
+        keep_alive=KEEP_ALIVE,
+        options=options,
+    )
     message = resp["message"]["content"].strip()
     print_start_end(message, 1/20)
+    corrections_cache[cache_key] = message
+    corrections_cache.sync()
     return message
 
-# Compares overlapping segments and finds the best matching similarity index
-def find_similarity(sentences1, sentences2):
-    best_similarity = 0
-    best_sentences1_start_index = 0
-    best_sentences2_start_index = 0
-    best_sentences2_end_index = 0
-    for sentences1_start_index in range(len(sentences1)): 
-        s1 = " ".join([s.text for s in sentences1[sentences1_start_index:]])
-        for sentences2_start_index in range(len(sentences2)): 
-            for sentences2_end_index in range(sentences2_start_index, len(sentences2)):
-                s2 = " ".join([s.text for s in sentences2[sentences2_start_index:sentences2_end_index]])
-                similarity = difflib.SequenceMatcher(None, s1, s2).ratio()
-                if best_similarity < similarity:
-                    best_similarity = similarity
-                    best_sentences1_start_index = sentences1_start_index
-                    best_sentences2_start_index = sentences2_start_index
-                    best_sentences2_end_index = sentences2_end_index
-    return best_similarity, best_sentences1_start_index, best_sentences2_start_index, best_sentences2_end_index
+# Returns the offset of each sentence inside " ".join(sentences), followed by the end offset
+# (one past the text, as if a separator followed the last sentence)
+def sentence_offsets(sentences):
+    offsets = []
+    position = 0
+    for sentence in sentences:
+        offsets.append(position)
+        position += len(sentence) + 1
+    offsets.append(position)
+    return offsets
+
+# Same as " ".join(sentences[start:end]), sliced out of the already joined text
+def joined_slice(text, offsets, start, end):
+    return text[offsets[start]:offsets[end] - 1] if end > start else ""
+
+# Upper bound of the similarity ratio of two strings given only their lengths (difflib's real_quick_ratio)
+def length_similarity_bound(length1, length2):
+    return 2 * min(length1, length2) / (length1 + length2) if length1 + length2 else 1
+
+# Threads a similarity search may use (0: every core). The search pool already runs one worker
+# per core, so each of them is pinned to a single thread when it starts.
+similarity_threads = 0
+
+def pin_similarity_threads():
+    global similarity_threads
+    similarity_threads = 1
+
+# Exact difflib ratios (without the autojunk heuristic) of a list of (s1, s2) pairs, scored in one batch
+def similarity_ratios(pairs):
+    if difflib_fast is not None:
+        return difflib_fast.ratio(pairs, threads=similarity_threads)
+    return [difflib.SequenceMatcher(None, s1, s2, autojunk=False).ratio() for s1, s2 in pairs]
+
+# Aligns the two segments in a single native pass and scores the sentence-bounded match around it,
+# returned as (similarity, sentences1 start, sentences2 start, sentences2 end) like find_similarity.
+# An alignment below score_cutoff is not scored: the empty match (0, 0, 0, 0) is returned instead.
+def aligned_similarity(sentences1, sentences2, score_cutoff=0):
+    if len(sentences1) == 0 or len(sentences2) == 0:
+        return 0, 0, 0, 0
+    text1 = " ".join(sentences1)
+    text2 = " ".join(sentences2)
+    offsets1 = sentence_offsets(sentences1)
+    offsets2 = sentence_offsets(sentences2)
+    alignment = fuzz.partial_ratio_alignment(text1, text2, score_cutoff=score_cutoff * 100)
+    if alignment is None:
+        return 0, 0, 0, 0
+    # Clamp to the candidates find_similarity enumerates, so the score is always reachable there
+    sentences1_start_index = min(bisect_right(offsets1, alignment.src_start) - 1, len(sentences1) - 1)
+    sentences2_start_index = min(bisect_right(offsets2, alignment.dest_start) - 1, len(sentences2) - 1)
+    sentences2_end_index = min(max(bisect_left(offsets2, alignment.dest_end), sentences2_start_index), len(sentences2) - 1)
+    s1 = joined_slice(text1, offsets1, sentences1_start_index, len(sentences1))
+    s2 = joined_slice(text2, offsets2, sentences2_start_index, sentences2_end_index)
+    return similarity_ratios([(s1, s2)])[0], sentences1_start_index, sentences2_start_index, sentences2_end_index
+
+# Compares overlapping segments (lists of sentence texts) and finds the best matching similarity index.
+# With a score_cutoff only matches reaching it are searched: when there is none, the aligned match is
+# returned instead of the best one, which is enough to tell the overlap was rejected.
+def find_similarity(sentences1, sentences2, score_cutoff=0):
+    # Nothing to match (e.g. an empty written overlap): no suffix to enumerate
+    if len(sentences1) == 0:
+        return 0, 0, 0, 0
+    # The Indel similarity (LCS based) is an upper bound of the difflib ratio, so pairs whose
+    # native score is below the best reachable ratio are skipped without changing the result
+    aligned = aligned_similarity(sentences1, sentences2, score_cutoff)
+    minimum_similarity = max(aligned[0], score_cutoff) - 1e-8
+    # Suffixes and windows are slices of the segments joined once
+    text1 = " ".join(sentences1)
+    text2 = " ".join(sentences2)
+    offsets1 = sentence_offsets(sentences1)
+    offsets2 = sentence_offsets(sentences2)
+    suffixes1 = [text1[offset:] for offset in offsets1[:-1]]
+    suffix_lengths1 = [len(s1) for s1 in suffixes1]
+    # Collect the windows of sentences2 that can still reach the bound, as (start, end) and text
+    windows = []
+    window_texts = []
+    for sentences2_start_index in range(len(sentences2)): 
+        for sentences2_end_index in range(sentences2_start_index, len(sentences2)):
+            # Skip windows whose length alone rules out every suffix, before joining them
+            window_length = offsets2[sentences2_end_index] - offsets2[sentences2_start_index] - 1 if sentences2_end_index > sentences2_start_index else 0
+            if max(length_similarity_bound(length1, window_length) for length1 in suffix_lengths1) < minimum_similarity:
+                # Once the window is longer than every suffix, longer windows only lower the bound
+                if window_length >= suffix_lengths1[0]:
+                    break
+                continue
+            windows.append((sentences2_start_index, sentences2_end_index))
+            window_texts.append(joined_slice(text2, offsets2, sentences2_start_index, sentences2_end_index))
+    # Score every suffix against every window in a single native call: scores below the cutoff come
+    # back as zero, the rest are the (sentences1 start, window) candidates left to score exactly.
+    # RapidFuzz only honours a normalized cutoff to about 1e-7, so it is passed a little low:
+    # pairs scoring exactly the threshold or the aligned seed must survive.
+    indel_cutoff = minimum_similarity - 1e-6
+    if indel_cutoff > 0 and windows:
+        indel_scores = process.cdist(suffixes1, window_texts, scorer=Indel.normalized_similarity, score_cutoff=indel_cutoff, workers=similarity_threads or -1)
+        surviving = zip(*numpy.nonzero(indel_scores))
+    else:
+        surviving = itertools.product(range(len(suffixes1)), range(len(windows)))
+    candidates = []
+    pairs = []
+    for sentences1_start_index, window_index in surviving:
+        candidates.append((int(sentences1_start_index), *windows[window_index]))
+        pairs.append((suffixes1[sentences1_start_index], window_texts[window_index]))
+    # Score all the candidates at once, then pick the best one (the aligned match is one of them)
+    best_similarity = aligned[0]
+    best_indexes = aligned[1:]
+    for similarity, indexes in zip(similarity_ratios(pairs), candidates):
+        # Ties keep the first match in (sentences1 start, sentences2 start, sentences2 end) order
+        if best_similarity < similarity or (best_similarity == similarity and indexes < best_indexes):
+            best_similarity = similarity
+            best_indexes = indexes
+    return (best_similarity, *best_indexes)
+
+# Index of the first sentence within MAX_OVERLAP_SIZE of the end of a segmented chunk, found by
+# binary search since sentence starts are increasing (None when there is no such sentence)
+def tail_overlap_start(corrected_segmented):
+    if len(corrected_segmented) > 0:
+        tail_overlap_index_start = bisect_left([s.start_char for s in corrected_segmented], corrected_segmented[-1].end_char + 1 - MAX_OVERLAP_SIZE)
+        if tail_overlap_index_start < len(corrected_segmented):
+            return tail_overlap_index_start
+    return None
+
+# Last sentence written for a chunk followed by another one: halfway through its tail overlap
+def written_end_index(sentences_count, tail_overlap_index_start):
+    return tail_overlap_index_start + round((sentences_count - tail_overlap_index_start)/2)
 
 # Main processing logic for correcting the full file
-def correct_file(input_path: str, output_path: str):
+async def correct_file(input_path: str, output_path: str):
     step=0
     if not os.path.isfile(input_path):
         print(f"❌ File '{input_path}' not found.")
         return
 
-    with open(input_path, "r", encoding="utf-8") as f:
-        full_text = f.read()
-        
     if os.path.exists(output_path):
         os.remove(output_path)
 
-    # Split text into overlapping paragraphs
-    paragraphs = full_text.split('\n')
-    paragraphs = chunk_sentences(paragraphs, CHUNK_CHARS_LIMIT, OVERLAP_PERCENT)
-
-    # Data structures to track chunk progress and positions
-    iteration_data = [{
-        "paragraph": paragraph,
-        "corrected_segmented": [],
-        "tail_overlap_index_start": 0, 
-        "written_indexes": {"start" : 0, "end": 0},
-    } for paragraph in paragraphs]
-
-    idx = 0
-    while idx < len(iteration_data):
-        matching_found = False
-        similarity_retry = 0
-        shorten_overlap_count = 0
-
-        while(not matching_found):
-            print(f"📝 Correcting chunk {idx}/{len(paragraphs)} …")
-            corrected = correct_chunk_with_ollama(iteration_data[idx]["paragraph"])
-            iteration_data[idx]["corrected_segmented"] = [s for s in nlp(corrected).sents]
-
-            if idx == 0:
-                # First chunk does not need overlap matching
-                matching_found = True
-            else:
-                last_overlap = iteration_data[idx - 1]["corrected_segmented"][iteration_data[idx - 1]["tail_overlap_index_start"]:len(iteration_data[idx - 1]["corrected_segmented"])-shorten_overlap_count]
-                similarity, old_start_index, start_index, end_index = find_similarity(last_overlap, iteration_data[idx]["corrected_segmented"])
-                print(f"🧬 Best similarity [{old_start_index}:{len(iteration_data[idx]["corrected_segmented"])}-1]/{len(iteration_data[idx]["corrected_segmented"])} [{start_index}:{end_index}]/{len(iteration_data[idx]["corrected_segmented"])} : {similarity}\n")
-                if similarity >= 1 - MISMATCH_THRESHOLD:
-                    print(f"✅ Similarity accepted\n")
-                    last_written_overlap = iteration_data[idx - 1]["corrected_segmented"][iteration_data[idx - 1]["tail_overlap_index_start"]:iteration_data[idx - 1]["written_indexes"]["end"]]
-                    _, _, _, iteration_data[idx]["written_indexes"]["start"] = find_similarity(last_written_overlap, iteration_data[idx]["corrected_segmented"])
-                    iteration_data[idx]["written_indexes"]["start"] += 1
-                    matching_found = True
-                
-                if not matching_found:
-                    similarity_retry += 1
-                    print(f"🧪 Similarity not found, best chance:")
-                    print("─────────────────────────────────────────────────────────────────────")
-                    print(" ".join([s.text for s in last_overlap[old_start_index:]]))
-                    print("─────────────────────────────────────────────────────────────────────")
-                    print("\nvs\n")
-                    print("─────────────────────────────────────────────────────────────────────")
-                    print(" ".join([s.text for s in iteration_data[idx]["corrected_segmented"][start_index:end_index]]))
-                    print("─────────────────────────────────────────────────────────────────────")
-                    if similarity_retry >= MAX_SIMILARITY_RETRIES:
-                        if shorten_overlap_count + 1 < len(iteration_data[idx - 1]["corrected_segmented"]) - iteration_data[idx - 1]["written_indexes"]["end"]:
-                            print("⚠️ Reducing overlap.")
-                            shorten_overlap_count += 1
-                            similarity_retry = 0
+    # Similarity searches run in worker processes, so the event loop keeps sending and collecting
+    # the corrections while they are computed. Searches are keyed by their arguments: the stitching
+    # picks up the result of one started ahead for the same segments, or starts it itself.
+    with ProcessPoolExecutor(max_workers=SIMILARITY_WORKERS, initializer=pin_similarity_threads) as similarity_pool:
+        loop = asyncio.get_running_loop()
+        similarity_searches = {}
+        speculative_searches = {}   # Keys of the searches started ahead for each boundary
+
+        def start_similarity_search(sentences1, sentences2, score_cutoff=0):
+            key = (tuple(sentences1), tuple(sentences2), score_cutoff)
+            if key not in similarity_searches:
+                similarity_searches[key] = loop.run_in_executor(similarity_pool, find_similarity, sentences1, sentences2, score_cutoff)
+            return key
+
+        async def search_similarity(sentences1, sentences2, score_cutoff=0):
+            return await similarity_searches.pop(start_similarity_search(sentences1, sentences2, score_cutoff))
+
+        # First pass: correct every chunk concurrently, bounded by the server parallelism.
+        # The stitching below awaits each chunk's first attempt in order, while the later ones are still running.
+        semaphore = asyncio.Semaphore(PARALLEL_REQUESTS)
+
+        async def bounded_correction(paragraph):
+            async with semaphore:
+                return await correct_chunk_with_ollama(paragraph)
+
+        # Once the first attempts on both sides of a boundary are in, start the two searches its stitching
+        # most likely needs: the ones for the chunk before accepted as is and no overlap reduction
+        def speculate_boundary(boundary):
+            previous, current = first_corrections[boundary - 1], first_corrections[boundary]
+            if not (previous.done() and current.done()):
+                return
+            if previous.cancelled() or current.cancelled() or previous.exception() or current.exception():
+                return
+            previous_segmented = segment_sentences(previous.result())
+            previous_texts = [s.text for s in previous_segmented]
+            current_texts = [s.text for s in segment_sentences(current.result())]
+            tail_overlap_index_start = tail_overlap_start(previous_segmented) or 0
+            speculative_searches[boundary] = [
+                start_similarity_search(previous_texts[tail_overlap_index_start:], current_texts, 1 - MISMATCH_THRESHOLD),
+                start_similarity_search(previous_texts[tail_overlap_index_start:written_end_index(len(previous_texts), tail_overlap_index_start)], current_texts),
+            ]
+
+        def speculate_around(chunk_index, task):
+            for boundary in (chunk_index, chunk_index + 1):
+                if 0 < boundary < len(first_corrections):
+                    speculate_boundary(boundary)
+
+        # Once a boundary has been stitched or reverted, the guesses it did not use are dropped:
+        # pending ones are cancelled, finished ones have their error (if any) marked as retrieved
+        def drop_speculation(boundary):
+            for key in speculative_searches.pop(boundary, []):
+                future = similarity_searches.pop(key, None)
+                if future is not None and not future.cancel() and not future.cancelled():
+                    future.exception()
+
+        # Split text into overlapping paragraphs, sending each one to the model as soon as it is ready
+        paragraphs = []
+        first_corrections = []
+        for paragraph in chunk_sentences(read_paragraphs(input_path)):
+            paragraphs.append(paragraph)
+            first_corrections.append(asyncio.create_task(bounded_correction(paragraph)))
+            first_corrections[-1].add_done_callback(functools.partial(speculate_around, len(first_corrections) - 1))
+            # Let the new request go out before segmenting the next chunk
+            await asyncio.sleep(0)
+
+        print(f"📝 Correcting {len(paragraphs)} chunks ({PARALLEL_REQUESTS} in parallel) …")
+
+        # Data structures to track chunk progress and positions
+        iteration_data = [{
+            "paragraph": paragraph,
+            "first_correction": first_correction,   # First-pass task, the attempt with seed 0
+            "revision": 0,              # Bumped on every revert so the chunk gets fresh attempts
+            "corrected_segmented": [],
+            "corrected_texts": [],
+            "tail_overlap_index_start": 0, 
+            "written_indexes": {"start" : 0, "end": 0},
+            "written_bytes": 0,         # Size of the segment this chunk appended to the output
+        } for paragraph, first_correction in zip(paragraphs, first_corrections)]
+
+        # The output is appended through a single handle for the whole run; it is flushed
+        # before every snapshot or rollback so those always see the file as written so far, and
+        # rollbacks truncate it through the same descriptor (appends always go to the new end).
+        with open(output_path, "ab") as out:
+            written_bytes = 0   # Output size, so rollbacks never need to measure or re-encode it
+            idx = 0
+            while idx < len(iteration_data):
+                boundary = idx
+                matching_found = False
+                similarity_retry = 0
+                shorten_overlap_count = 0
+
+                while(not matching_found):
+                    print(f"📝 Correcting chunk {idx}/{len(paragraphs)} …")
+                    # Attempts are seeded by revision and retry: after an overlap reduction the same
+                    # answers are checked again from the cache, a revert asks the model for new ones
+                    seed = iteration_data[idx]["revision"] * MAX_SIMILARITY_RETRIES + similarity_retry
+                    if seed == 0:
+                        corrected = await iteration_data[idx]["first_correction"]
+                    else:
+                        corrected = await correct_chunk_with_ollama(iteration_data[idx]["paragraph"], seed)
+                    iteration_data[idx]["corrected_segmented"] = segment_sentences(corrected)
+                    iteration_data[idx]["corrected_texts"] = [s.text for s in iteration_data[idx]["corrected_segmented"]]
+
+                    if idx == 0:
+                        # First chunk does not need overlap matching
+                        matching_found = True
+                    else:
+                        last_overlap = iteration_data[idx - 1]["corrected_texts"][iteration_data[idx - 1]["tail_overlap_index_start"]:len(iteration_data[idx - 1]["corrected_texts"])-shorten_overlap_count]
+                        similarity, old_start_index, start_index, end_index = await search_similarity(last_overlap, iteration_data[idx]["corrected_texts"], 1 - MISMATCH_THRESHOLD)
+                        # An empty match means the search was cut short: no window reached the threshold
+                        empty_match = end_index == start_index
+                        if empty_match:
+                            print(f"🧬 No overlap candidate reached similarity {1 - MISMATCH_THRESHOLD}\n")
                         else:
-                            # If similarity match fails too many times, go back one chunk
-                            print("❌ Similarity retied too many times, reverting to the chunk before.")
-                            backup_file(output_path, step)
-                            step += 1
-                            idx -= 1
-                            shorten_overlap_count = 0
-                            if idx > 0:
-                                start_write_char = iteration_data[idx]["corrected_segmented"][iteration_data[idx]["written_indexes"]["start"]].start_char
-                                if idx > 0:
-                                    start_write_char -= 1
-                                end_write_char = iteration_data[idx]["corrected_segmented"][iteration_data[idx]["written_indexes"]["end"]].end_char
-                                truncate_file(output_path, end_write_char - start_write_char)
+                            print(f"🧬 Best similarity [{old_start_index}:{len(iteration_data[idx]['corrected_segmented'])}-1]/{len(iteration_data[idx]['corrected_segmented'])} [{start_index}:{end_index}]/{len(iteration_data[idx]['corrected_segmented'])} : {similarity}\n")
+                        if similarity >= 1 - MISMATCH_THRESHOLD:
+                            print(f"✅ Similarity accepted\n")
+                            last_written_overlap = iteration_data[idx - 1]["corrected_texts"][iteration_data[idx - 1]["tail_overlap_index_start"]:iteration_data[idx - 1]["written_indexes"]["end"]]
+                            _, _, _, iteration_data[idx]["written_indexes"]["start"] = await search_similarity(last_written_overlap, iteration_data[idx]["corrected_texts"])
+                            iteration_data[idx]["written_indexes"]["start"] += 1
+                            matching_found = True
+                
+                        if not matching_found:
+                            similarity_retry += 1
+                            if empty_match:
+                                print(f"🧪 Similarity not found.")
                             else:
-                                os.remove(output_path)
-                            break 
-
-        if matching_found:
-            # Save overlap for the next chunk
-            i = 0
-            for i in reversed(range(len(iteration_data[idx]["corrected_segmented"]))):
-                if iteration_data[idx]["corrected_segmented"][-1].end_char - iteration_data[idx]["corrected_segmented"][i].start_char + 1 <= MAX_OVERLAP_SIZE:    
-                    iteration_data[idx]["tail_overlap_index_start"] = i
-                else:
-                    break
+                                print(f"🧪 Similarity not found, best chance:")
+                                print("─────────────────────────────────────────────────────────────────────")
+                                print(" ".join(last_overlap[old_start_index:]))
+                                print("─────────────────────────────────────────────────────────────────────")
+                                print("\nvs\n")
+                                print("─────────────────────────────────────────────────────────────────────")
+                                print(" ".join(iteration_data[idx]["corrected_texts"][start_index:end_index]))
+                                print("─────────────────────────────────────────────────────────────────────")
+                            if similarity_retry >= MAX_SIMILARITY_RETRIES:
+                                if shorten_overlap_count + 1 < len(iteration_data[idx - 1]["corrected_segmented"]) - iteration_data[idx - 1]["written_indexes"]["end"]:
+                                    print("⚠️ Reducing overlap.")
+                                    shorten_overlap_count += 1
+                                    similarity_retry = 0
+                                else:
+                                    # If similarity match fails too many times, go back one chunk
+                                    print("❌ Similarity retied too many times, reverting to the chunk before.")
+                                    out.flush()
+                                    backup_file(output_path, step)
+                                    step += 1
+                                    iteration_data[idx]["revision"] += 1
+                                    idx -= 1
+                                    iteration_data[idx]["revision"] += 1
+                                    shorten_overlap_count = 0
+                                    # The chunk gone back to wrote last, so its segment is the end of the output
+                                    written_bytes -= iteration_data[idx]["written_bytes"]
+                                    os.ftruncate(out.fileno(), written_bytes)
+                                    break 
+
+                if matching_found:
+                    # Save overlap for the next chunk
+                    tail_overlap_index_start = tail_overlap_start(iteration_data[idx]["corrected_segmented"])
+                    if tail_overlap_index_start is not None:
+                        iteration_data[idx]["tail_overlap_index_start"] = tail_overlap_index_start
             
-            if idx < len(iteration_data) - 1:
-                overlap_sentences_count = len(iteration_data[idx]["corrected_segmented"]) - iteration_data[idx]["tail_overlap_index_start"]
-                iteration_data[idx]["written_indexes"]["end"] = iteration_data[idx]["tail_overlap_index_start"] + round(overlap_sentences_count/2)
-            else:
-                iteration_data[idx]["written_indexes"]["end"] = len(iteration_data[idx]["corrected_segmented"]) - 1
+                    if idx < len(iteration_data) - 1:
+                        iteration_data[idx]["written_indexes"]["end"] = written_end_index(len(iteration_data[idx]["corrected_segmented"]), iteration_data[idx]["tail_overlap_index_start"])
+                    else:
+                        iteration_data[idx]["written_indexes"]["end"] = len(iteration_data[idx]["corrected_segmented"]) - 1
 
                 
-            start_write_char = iteration_data[idx]["corrected_segmented"][iteration_data[idx]["written_indexes"]["start"]].start_char
-            if iteration_data[idx]["written_indexes"]["start"] > 0:
-                start_write_char -= 1
-            end_write_char = iteration_data[idx]["corrected_segmented"][iteration_data[idx]["written_indexes"]["end"]].end_char
-            writing_segment = corrected[start_write_char:end_write_char]
+                    start_write_char = iteration_data[idx]["corrected_segmented"][iteration_data[idx]["written_indexes"]["start"]].start_char
+                    if iteration_data[idx]["written_indexes"]["start"] > 0:
+                        start_write_char -= 1
+                    end_write_char = iteration_data[idx]["corrected_segmented"][iteration_data[idx]["written_indexes"]["end"]].end_char
+                    writing_segment = corrected[start_write_char:end_write_char]
 
-            if idx > 0:
-                backup_file(output_path, step)
-            step += 1
+                    if idx > 0:
+                        out.flush()
+                        backup_file(output_path, step)
+                    step += 1
 
 
-            # Write corrected chunk to output file
-            with open(output_path, "a", encoding="utf-8") as out:
-                out.write(writing_segment)
-            print(f"✅ Done! Output in: {output_path}")
+                    # Write corrected chunk to output file
+                    iteration_data[idx]["written_bytes"] = out.write(encode_output(writing_segment))
+                    written_bytes += iteration_data[idx]["written_bytes"]
+                    print(f"✅ Done! Output in: {output_path}")
                 
 
-            idx += 1
+                    idx += 1
+
+                # The boundary has been stitched or reverted: its unused guesses can go
+                drop_speculation(boundary)
+
 
 # ─── Command Line Interface ───────────────────────────────────────────────────
 if __name__ == "__main__":
@@ -239,4 +549,4 @@ if __name__ == "__main__":
     else:
         if os.path.exists(sys.argv[2]):
             os.remove(sys.argv[2])
-        correct_file(sys.argv[1], sys.argv[2])
+        asyncio.run(correct_file(sys.argv[1], sys.argv[2]))